@@ -1,12 +1,29 @@
 import os
 import re
-import json
 import time
+import hashlib
+import atexit
+import queue
+import sqlite3
+import asyncio
+import tempfile
+import subprocess
+import httpx
+import orjson
+import pandas as pd
 import requests
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from types import MappingProxyType
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote, quote_plus
+from urllib3.util import Retry
 from flask import Flask, render_template, request, jsonify, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
 import threading
 
@@ -27,15 +44,130 @@ CONFIG = {
     'SUPABASE_TABLE': os.getenv('SUPABASE_TABLE', 'inventory'),
 }
 
-# Global state for processing
+# Number of VINs appraised in parallel (one browser context each)
+APPRAISAL_CONCURRENCY = int(os.getenv('APPRAISAL_CONCURRENCY', '4'))
+
+# Signal.vin API responses needed to compute an export value, by URL
+SIGNAL_API_RESPONSES = {
+    'decode': lambda url: 'decode' in url and 'signal.vin' in url,
+    'offer/initial': lambda url: 'offer/initial' in url,
+    'wholesale_value_trends': lambda url: 'wholesale_value_trends' in url,
+}
+# Anything in a request that looks like a VIN
+VIN_TOKEN_RE = re.compile(r'(?<![A-Z0-9])[A-HJ-NPR-Z0-9]{17}(?![A-Z0-9])')
+RESPONSE_TIMEOUT_MS = 20000
+
+# Fields read from those responses; everything else is discarded
+SIGNAL_API_FIELDS = (
+    'make', 'model', 'selected_trim', 'suggested_trim', 'customs_duty_rate',
+    'exchange_rate', 'current_weekly_depreciation_factor', 'offer_setup',
+    'wholesale_value_trends',
+)
+
+# Subresources the appraisal pages don't need; the JSON API calls go
+# through as document/xhr/fetch requests
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'media', 'stylesheet'}
+
+# Browser appraisals per context before it is closed and replaced; closing
+# the context is what releases Chromium's memory
+CONTEXT_RECYCLE_VINS = 50
+
+# Directory of saved Signal.vin login sessions, one file per account
+SIGNAL_AUTH_DIR = os.getenv('SIGNAL_AUTH_DIR', 'auth')
+
+# Port of the long-lived Chromium that appraisal runs connect to over CDP
+BROWSER_CDP_PORT = int(os.getenv('BROWSER_CDP_PORT', '9222'))
+
+# Characters stripped from price strings before float conversion
+PRICE_CLEAN_RE = re.compile(r'[^\d.-]')
+
+# First VIN characters of vehicles we appraise (US-built)
+VALID_VIN_PREFIXES = frozenset({'1', '4', '5'})
+
+# Inventory columns used by the appraisal flow
+INVENTORY_COLUMNS = "vin,kilometers,trim,price,listing_link,carfax_link,make,model"
+# Rows per inventory page and pages fetched in parallel
+INVENTORY_PAGE_SIZE = 1000
+INVENTORY_FETCH_WORKERS = 8
+# Inventory column -> vehicle field sent to the UI
+INVENTORY_FIELDS = {
+    'vin': 'vin',
+    'kilometers': 'odometer',
+    'trim': 'trim',
+    'price': 'list_price',
+    'listing_link': 'listing_url',
+    'carfax_link': 'carfax_link',
+    'make': 'make',
+    'model': 'model',
+}
+
+# Shared HTTP session so Supabase calls reuse pooled connections
+# Transient Supabase errors are retried with backoff; the upsert is
+# idempotent, so POSTs are safe to retry. Read timeouts are not retried:
+# a hanging request would hold a save thread for several timeouts
+SAVE_RETRY = Retry(
+    total=3,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=[429, 502, 503, 504],
+    allowed_methods=frozenset({'GET', 'POST'}),
+    raise_on_status=False
+)
+# (connect, read) seconds for one upsert request
+SAVE_TIMEOUT = (5, 30)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=32, max_retries=SAVE_RETRY))
+SESSION.mount("http://", HTTPAdapter(pool_connections=20, pool_maxsize=32, max_retries=SAVE_RETRY))
+
+# HTTP/2 client for inventory reads; concurrent requests share one connection
+HTTP_CLIENT = httpx.Client(http2=True, timeout=60, limits=httpx.Limits(max_connections=20))
+
+# Threads used to write results while the next VINs are appraised
+SAVE_WORKERS = 8
+# Results upserted per request to appraisal_results
+SAVE_BATCH_SIZE = 100
+
+# After this many failed saves in a row, skip Supabase for the cooldown
+# (seconds) and queue results in the local SQLite file instead
+SAVE_BREAKER_THRESHOLD = 10
+SAVE_BREAKER_COOLDOWN = 60
+PENDING_SAVES_DB = os.getenv('PENDING_SAVES_DB', 'pending_saves.db')
+# Transient failures a queued row may hit before it is set aside
+PENDING_SAVE_MAX_ATTEMPTS = 5
+save_breaker = {
+    'failures': 0,
+    'last_failure': 0.0
+}
+save_breaker_lock = threading.Lock()
+pending_saves_lock = threading.Lock()
+
+# Number of log lines kept in memory
+LOG_HISTORY = 500
+
+# Events buffered per /api/stream client before new ones are dropped
+STREAM_QUEUE_SIZE = 1000
+# Each open stream holds a gunicorn thread; keep some free for the other
+# routes (see --threads in the Dockerfile). Extra clients fall back to polling
+STREAM_MAX_SUBSCRIBERS = 4
+
+# Global state for processing, shared by the worker and the routes;
+# guard every read and write with state_lock
 processing_state = {
+    # True from start until the worker thread has finished; a stop only
+    # sets stop_requested, and run_id tells a run's updates from the next's
     'is_processing': False,
+    'stop_requested': False,
+    'run_id': 0,
     'current_vin': '',
     'progress': 0,
     'total': 0,
     'results': [],
-    'logs': []
+    'logs': deque(maxlen=LOG_HISTORY)
 }
+state_lock = threading.Lock()
+
+# One event queue per connected /api/stream client, also guarded by state_lock
+stream_subscribers = []
 
 # ============================================
 # HELPER FUNCTIONS
@@ -44,8 +176,39 @@ processing_state = {
 def log_message(msg):
     """Add log message"""
     timestamp = datetime.now().strftime('%H:%M:%S')
-    processing_state['logs'].append(f"[{timestamp}] {msg}")
-    print(f"[{timestamp}] {msg}")
+    line = f"[{timestamp}] {msg}"
+    with state_lock:
+        processing_state['logs'].append(line)
+        publish_event('log', line)
+    print(line)
+
+def status_snapshot():
+    """Current progress counters; call with state_lock held"""
+    return {
+        'is_processing': processing_state['is_processing'],
+        'stop_requested': processing_state['stop_requested'],
+        'current_vin': processing_state['current_vin'],
+        'progress': processing_state['progress'],
+        'total': processing_state['total'],
+        'results_count': len(processing_state['results'])
+    }
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+def publish_event(event, data):
+    """Push an event to every stream client; call with state_lock held"""
+    message = format_event(event, data)
+    for events in stream_subscribers:
+        try:
+            events.put_nowait(message)
+        except queue.Full:
+            # Slow client: drop the event rather than block the worker
+            pass
+
+def json_response(payload):
+    """JSON response serialized with orjson, for the larger payloads"""
+    return Response(orjson.dumps(payload), mimetype='application/json')
 
 def get_supabase_headers(api_key):
     return {
@@ -55,156 +218,400 @@ def get_supabase_headers(api_key):
         "Prefer": "return=representation"
     }
 
+def refresh_supabase_headers():
+    """Rebuild the cached Supabase headers after the API key changes"""
+    CONFIG['_headers'] = MappingProxyType(get_supabase_headers(CONFIG['SUPABASE_API_KEY']))
+
+refresh_supabase_headers()
+
 def parse_price(price_str):
     if not price_str:
         return 0.0
     try:
-        cleaned = re.sub(r'[^\d.-]', '', str(price_str))
+        cleaned = PRICE_CLEAN_RE.sub('', str(price_str))
         return float(cleaned) if cleaned else 0.0
     except:
         return 0.0
 
-def is_valid_vin(vin, prefixes=('1', '4', '5')):
-    if not vin or len(vin) < 17:
-        return False
-    return vin.strip().upper().startswith(prefixes)
+def fetch_inventory_page(url, headers, offset, count=False):
+    """Fetch one Range page of inventory; returns (rows, response)"""
+    page_headers = {
+        **headers,
+        "Range-Unit": "items",
+        "Range": f"{offset}-{offset + INVENTORY_PAGE_SIZE - 1}"
+    }
+    if count:
+        page_headers["Prefer"] = "count=exact"
+    
+    response = HTTP_CLIENT.get(url, headers=page_headers)
+    if response.status_code == 416:
+        return [], response
+    response.raise_for_status()
+    return orjson.loads(response.content), response
+
+def fetch_inventory(supabase_url, headers, table_name):
+    """Stream inventory from Supabase as pages of rows; raises if any page fails"""
+    url = f"{supabase_url}/rest/v1/{table_name}?select={INVENTORY_COLUMNS}"
+    
+    # The first page also reports the row count, e.g. "0-999/12345"
+    page, response = fetch_inventory_page(url, headers, 0, count=True)
+    if page:
+        yield page
+        
+    total = response.headers.get('content-range', '').rpartition('/')[2]
+    if total.isdigit():
+        offsets = range(INVENTORY_PAGE_SIZE, int(total), INVENTORY_PAGE_SIZE)
+        # Remaining pages are fetched in parallel over the shared HTTP/2 connection
+        with ThreadPoolExecutor(max_workers=INVENTORY_FETCH_WORKERS) as executor:
+            for page, _ in executor.map(lambda offset: fetch_inventory_page(url, headers, offset), offsets):
+                if page:
+                    yield page
+    else:
+        offset = 0
+        while len(page) == INVENTORY_PAGE_SIZE:
+            offset += INVENTORY_PAGE_SIZE
+            page, _ = fetch_inventory_page(url, headers, offset)
+            if page:
+                yield page
+
+def build_appraisal_payload(result):
+    """Map an appraisal result to an appraisal_results row"""
+    price_val = result.get('list_price', 0)
+    if isinstance(price_val, str):
+        price_val = parse_price(price_val)
+    
+    profit_val = result.get('profit')
+    if profit_val is not None:
+        try:
+            profit_val = float(profit_val)
+        except:
+            profit_val = None
+    
+    return {
+        "vin": result.get('vin', ''),
+        "kilometers": str(result.get('odometer', '')),
+        "listing_link": result.get('listing_url', ''),
+        "carfax_link": result.get('carfax_link', ''),
+        "make": result.get('make', ''),
+        "model": result.get('model', ''),
+        "trim": result.get('signal_trim', ''),
+        "price": price_val,
+        "export_value": result.get('export_value_cad'),
+        "profit": profit_val,
+        "status": result.get('status', '')
+    }
 
-def fetch_inventory(supabase_url, api_key, table_name):
-    """Fetch all inventory from Supabase"""
-    all_data = []
-    batch_size = 1000
-    offset = 0
+def post_appraisal_rows(supabase_url, headers, rows):
+    """Upsert appraisal_results rows; returns 'saved', 'retry' or 'rejected'"""
+    url = f"{supabase_url}/rest/v1/appraisal_results?on_conflict=vin"
+    upsert_headers = {
+        **headers,
+        "Prefer": "resolution=merge-duplicates,return=minimal"
+    }
+    # Postgres rejects an upsert that touches the same VIN twice; keep the latest
+    rows = list({row['vin']: row for row in rows}.values())
     
     try:
+        response = SESSION.post(url, json=rows, headers=upsert_headers, timeout=SAVE_TIMEOUT)
+    except Exception as e:
+        log_message(f"❌ Save error: {e}")
+        return 'retry'
+    
+    if response.status_code in [200, 201, 204]:
+        return 'saved'
+    log_message(f"❌ Save failed: {response.status_code}")
+    # Rate limits and server errors may clear up; other errors won't
+    if response.status_code == 429 or response.status_code >= 500:
+        return 'retry'
+    return 'rejected'
+
+def save_circuit_open():
+    """True while Supabase saves are paused after repeated failures"""
+    with save_breaker_lock:
+        return (
+            save_breaker['failures'] >= SAVE_BREAKER_THRESHOLD
+            and time.monotonic() - save_breaker['last_failure'] < SAVE_BREAKER_COOLDOWN
+        )
+
+def record_save_outcome(success):
+    with save_breaker_lock:
+        if success:
+            save_breaker['failures'] = 0
+        else:
+            save_breaker['failures'] += 1
+            save_breaker['last_failure'] = time.monotonic()
+
+def open_pending_saves():
+    db = sqlite3.connect(PENDING_SAVES_DB, timeout=30)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS pending_saves ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, supabase_url TEXT NOT NULL, row TEXT NOT NULL, "
+        "attempts INTEGER NOT NULL DEFAULT 0)"
+    )
+    return db
+
+def queue_pending_saves(supabase_url, rows):
+    """Keep rows that couldn't be saved in the local SQLite queue"""
+    with closing(open_pending_saves()) as db:
+        db.executemany(
+            "INSERT INTO pending_saves (supabase_url, row) VALUES (?, ?)",
+            [(supabase_url, orjson.dumps(row).decode()) for row in rows]
+        )
+        db.commit()
+    log_message(f"💾 Queued {len(rows)} results locally for a later retry")
+
+def has_pending_saves(supabase_url):
+    """True while queued rows for this Supabase project are waiting to be sent"""
+    if not os.path.exists(PENDING_SAVES_DB):
+        return False
+    with closing(open_pending_saves()) as db:
+        return db.execute(
+            "SELECT 1 FROM pending_saves WHERE supabase_url = ? AND attempts < ? LIMIT 1",
+            (supabase_url, PENDING_SAVE_MAX_ATTEMPTS)
+        ).fetchone() is not None
+
+def flush_pending_saves(supabase_url, headers, saved_rows):
+    """Send queued rows for this Supabase project, oldest first; call with pending_saves_lock held"""
+    with closing(open_pending_saves()) as db:
+        # Queued copies of VINs that were just saved are older; sending
+        # them now would overwrite the newer appraisal
+        db.executemany(
+            "DELETE FROM pending_saves WHERE supabase_url = ? AND json_extract(row, '$.vin') = ?",
+            [(supabase_url, row['vin']) for row in saved_rows]
+        )
+        db.commit()
+        
         while True:
-            url = f"{supabase_url}/rest/v1/{table_name}?select=*&limit={batch_size}&offset={offset}"
-            response = requests.get(url, headers=get_supabase_headers(api_key), timeout=60)
-            response.raise_for_status()
-            batch = response.json()
-            
-            if not batch:
+            # Rows at the attempt limit stay in the file for inspection
+            # but no longer block the rest of the queue
+            queued = db.execute(
+                "SELECT id, row FROM pending_saves WHERE supabase_url = ? AND attempts < ? ORDER BY id LIMIT ?",
+                (supabase_url, PENDING_SAVE_MAX_ATTEMPTS, SAVE_BATCH_SIZE)
+            ).fetchall()
+            if not queued:
                 break
-            all_data.extend(batch)
-            if len(batch) < batch_size:
+            
+            ids = [(row_id,) for row_id, _ in queued]
+            rows = [orjson.loads(row) for _, row in queued]
+            outcome = post_appraisal_rows(supabase_url, headers, rows)
+            
+            if outcome == 'saved':
+                db.executemany("DELETE FROM pending_saves WHERE id = ?", ids)
+                db.commit()
+                log_message(f"✅ Saved {len(rows)} queued results to DB")
+                continue
+            
+            if outcome == 'rejected':
+                db.executemany("UPDATE pending_saves SET attempts = ? WHERE id = ?",
+                               [(PENDING_SAVE_MAX_ATTEMPTS, row_id) for (row_id,) in ids])
+                log_message(f"⚠️ Supabase rejected {len(rows)} queued results; set aside in {PENDING_SAVES_DB}")
+            else:
+                db.executemany("UPDATE pending_saves SET attempts = attempts + 1 WHERE id = ?", ids)
+            db.commit()
+            
+            if outcome == 'retry':
                 break
-            offset += batch_size
-        
-        return all_data
-    except Exception as e:
-        log_message(f"❌ Error fetching inventory: {e}")
-        return []
 
-def save_to_appraisal_results(supabase_url, api_key, result):
-    """Save result to appraisal_results table"""
-    try:
-        url = f"{supabase_url}/rest/v1/appraisal_results"
-        
-        export_val = None
-        if result.get('export_value_cad'):
-            try:
-                clean_val = str(result['export_value_cad']).replace(',', '').replace('$', '').strip()
-                export_val = float(clean_val)
-            except:
-                pass
+def send_appraisal_rows(supabase_url, headers, rows):
+    """Post a new batch, queueing it if the failure may clear up; True once saved"""
+    outcome = post_appraisal_rows(supabase_url, headers, rows)
+    record_save_outcome(outcome != 'retry')
+    
+    if outcome == 'retry':
+        queue_pending_saves(supabase_url, rows)
+        return False
+    if outcome == 'rejected':
+        # Resending the same rows would fail the same way
+        log_message(f"⚠️ Supabase rejected {len(rows)} results; not queued")
+        return False
+    
+    log_message(f"✅ Saved {len(rows)} results to DB")
+    return True
+
+def save_batch(supabase_url, headers, results):
+    """Upsert a batch of results into appraisal_results in one request"""
+    rows = [build_appraisal_payload(result) for result in results]
+    
+    if save_circuit_open():
+        queue_pending_saves(supabase_url, rows)
+        return False
+    
+    if not has_pending_saves(supabase_url):
+        return send_appraisal_rows(supabase_url, headers, rows)
+    
+    # Queued rows are older than this batch. Save it while holding the
+    # queue so no flush can land an older row for these VINs afterwards
+    with pending_saves_lock:
+        if not send_appraisal_rows(supabase_url, headers, rows):
+            return False
+        flush_pending_saves(supabase_url, headers, rows)
+    return True
+
+# ============================================
+# SHARED BROWSER
+# ============================================
+
+shared_browser = {
+    'process': None,
+    'endpoint': None
+}
+shared_browser_lock = threading.Lock()
+
+def _stop_shared_browser():
+    process = shared_browser['process']
+    if process and process.poll() is None:
+        process.terminate()
+
+atexit.register(_stop_shared_browser)
+
+def get_shared_browser_endpoint(headless=True):
+    """Launch the long-lived Chromium once and return its CDP websocket endpoint"""
+    with shared_browser_lock:
+        process = shared_browser['process']
+        if process and process.poll() is None:
+            return shared_browser['endpoint']
         
-        price_val = result.get('list_price', 0)
-        if isinstance(price_val, str):
-            price_val = parse_price(price_val)
+        with sync_playwright() as p:
+            executable = p.chromium.executable_path
         
-        profit_val = result.get('profit')
-        if profit_val is not None:
-            try:
-                profit_val = float(profit_val)
-            except:
-                profit_val = None
-        
-        payload = {
-            "vin": result.get('vin', ''),
-            "kilometers": str(result.get('odometer', '')),
-            "listing_link": result.get('listing_url', ''),
-            "carfax_link": result.get('carfax_link', ''),
-            "make": result.get('make', ''),
-            "model": result.get('model', ''),
-            "trim": result.get('signal_trim', ''),
-            "price": price_val,
-            "export_value": export_val,
-            "profit": profit_val,
-            "status": result.get('status', '')
-        }
+        args = [
+            executable,
+            f'--remote-debugging-port={BROWSER_CDP_PORT}',
+            f'--user-data-dir={tempfile.mkdtemp(prefix="signal-chromium-")}',
+            '--no-first-run',
+            '--no-default-browser-check',
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+        ]
+        if headless:
+            args.append('--headless=new')
+        args.append('about:blank')
         
-        response = requests.post(url, json=payload, headers=get_supabase_headers(api_key), timeout=30)
+        process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         
-        if response.status_code in [200, 201]:
-            log_message(f"✅ Saved to DB: {result.get('vin')}")
-            return True
+        # Wait for the DevTools endpoint to come up
+        version_url = f"http://127.0.0.1:{BROWSER_CDP_PORT}/json/version"
+        for _ in range(50):
+            try:
+                endpoint = requests.get(version_url, timeout=1).json()['webSocketDebuggerUrl']
+                break
+            except Exception:
+                if process.poll() is not None:
+                    raise RuntimeError("Shared browser exited during startup")
+                time.sleep(0.2)
         else:
-            log_message(f"❌ Save failed: {response.status_code}")
-            return False
-    except Exception as e:
-        log_message(f"❌ Save error: {e}")
-        return False
+            process.terminate()
+            raise RuntimeError("Shared browser did not expose a CDP endpoint")
+        
+        shared_browser['process'] = process
+        shared_browser['endpoint'] = endpoint
+        log_message("🌍 Shared browser launched")
+        return endpoint
 
 # ============================================
 # SIGNAL.VIN AUTOMATION CLASS
 # ============================================
 
 class SignalVinAutomation:
-    def __init__(self, headless=True):
-        self.headless = headless
+    def __init__(self, browser_endpoint, email):
+        self.browser_endpoint = browser_endpoint
+        # One saved session per account, so changing SIGNAL_EMAIL never
+        # reuses another account's login
+        account = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:16]
+        self.auth_state_path = os.path.join(SIGNAL_AUTH_DIR, f"{account}.json")
         self.browser = None
+        self.context = None
+        self.contexts = []
+        self.context_lock = None
+        self.storage_state = None
+        self.api_replay = None
+        self.api_candidate = None
+        self.api_checking = False
+        self.api_replay_failed = False
+        self.api_client = None
         self.page = None
         self.playwright = None
         self.logged_in = False
         self.signal_url = "https://app.signal.vin"
-        self.captured_responses = []
-        self.vehicle_make = ''
-        self.vehicle_model = ''
-        self.vehicle_trim = ''
-    
-    def start(self):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=self.headless, slow_mo=50)
-        context = self.browser.new_context(
-            viewport={'width': 1280, 'height': 720},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        )
-        self.page = context.new_page()
-        self.page.on("response", self._capture_response)
+        self.context_options = {
+            'viewport': {'width': 1280, 'height': 720},
+            'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+        }
+    
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.connect_over_cdp(self.browser_endpoint)
+        self.context_lock = asyncio.Lock()
+        # Reuse the session saved by an earlier run when there is one
+        options = {'storage_state': self.auth_state_path} if os.path.exists(self.auth_state_path) else {}
+        self.context = await self.new_context(**options)
+        self.page = await self.context.new_page()
         return True
     
-    def _capture_response(self, response):
-        try:
-            url = response.url
-            if 'signal.vin' in url or 'export' in url.lower():
-                try:
-                    body = response.text()
-                    self.captured_responses.append({
-                        'url': url,
-                        'status': response.status,
-                        'body': body if body else ''
-                    })
-                except:
-                    pass
-        except:
-            pass
+    async def save_session(self):
+        """Save the logged-in session for new contexts and later runs"""
+        os.makedirs(SIGNAL_AUTH_DIR, exist_ok=True)
+        await self.context.storage_state(path=self.auth_state_path)
+        self.storage_state = self.auth_state_path
     
-    def stop(self):
+    async def new_context(self, **options):
+        """Create an isolated context on the shared browser"""
+        async with self.context_lock:
+            context = await self.browser.new_context(**self.context_options, **options)
+        self.contexts.append(context)
+        return context
+    
+    async def close_context(self, context):
+        self.contexts.remove(context)
         try:
-            if self.browser:
-                self.browser.close()
+            await context.close()
         except:
             pass
+    
+    async def new_session_page(self):
+        """Open a page in a new context that shares the logged-in session"""
+        if self.storage_state is None:
+            self.storage_state = await self.context.storage_state()
+        context = await self.new_context(storage_state=self.storage_state)
+        page = await context.new_page()
+        await page.route("**/*", self._block_static_assets)
+        return page
+    
+    async def worker_page(self, slot):
+        """Page for a worker slot; its context is replaced every CONTEXT_RECYCLE_VINS VINs"""
+        if slot['page'] is None or slot['uses'] >= CONTEXT_RECYCLE_VINS:
+            if slot['page'] is not None:
+                await self.close_context(slot['page'].context)
+            slot['page'] = await self.new_session_page()
+            slot['uses'] = 0
+        slot['uses'] += 1
+        return slot['page']
+    
+    async def _block_static_assets(self, route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+    
+    async def stop(self):
+        await self._disable_api()
+        # The browser is shared across runs: close only our contexts
+        for context in list(self.contexts):
+            try:
+                await context.close()
+            except:
+                pass
         try:
             if self.playwright:
-                self.playwright.stop()
+                await self.playwright.stop()
         except:
             pass
     
-    def login(self, email, password):
+    async def login(self, email, password):
         try:
             log_message("🔐 Logging in to Signal.vin...")
-            self.page.goto(self.signal_url, wait_until='networkidle')
-            time.sleep(3)
+            await self.page.goto(self.signal_url, wait_until='networkidle')
+            await asyncio.sleep(3)
             
             if "dashboard" in self.page.url or "appraisal" in self.page.url:
                 log_message("✅ Already logged in!")
@@ -213,41 +620,41 @@ class SignalVinAutomation:
             
             try:
                 login_btn = self.page.locator('a:has-text("Login"), button:has-text("Login")').first
-                if login_btn.is_visible():
-                    login_btn.click()
-                    time.sleep(3)
+                if await login_btn.is_visible():
+                    await login_btn.click()
+                    await asyncio.sleep(3)
             except:
                 pass
             
-            time.sleep(2)
+            await asyncio.sleep(2)
             
             email_field = self.page.locator('input').nth(0)
-            email_field.click()
-            time.sleep(0.3)
-            email_field.fill('')
-            email_field.type(email, delay=50)
+            await email_field.click()
+            await asyncio.sleep(0.3)
+            await email_field.fill('')
+            await email_field.type(email, delay=50)
             
-            self.page.keyboard.press('Tab')
-            time.sleep(0.3)
-            self.page.keyboard.type(password, delay=50)
+            await self.page.keyboard.press('Tab')
+            await asyncio.sleep(0.3)
+            await self.page.keyboard.type(password, delay=50)
             
             # Try to click agree checkbox
             try:
                 checkbox = self.page.locator('input[type="checkbox"]').first
-                if checkbox.is_visible(timeout=2000):
-                    checkbox.click()
+                if await checkbox.is_visible(timeout=2000):
+                    await checkbox.click()
             except:
                 pass
             
             # Click login button
             try:
                 login_submit = self.page.locator('button:has-text("Login"), button:has-text("Sign in")').first
-                if login_submit.is_visible(timeout=2000):
-                    login_submit.click()
+                if await login_submit.is_visible(timeout=2000):
+                    await login_submit.click()
             except:
-                self.page.keyboard.press('Enter')
+                await self.page.keyboard.press('Enter')
             
-            time.sleep(5)
+            await asyncio.sleep(5)
             
             # Wait for redirect
             for _ in range(20):
@@ -255,7 +662,7 @@ class SignalVinAutomation:
                     log_message("✅ Login successful!")
                     self.logged_in = True
                     return True
-                time.sleep(1)
+                await asyncio.sleep(1)
             
             log_message("❌ Login failed - check credentials")
             return False
@@ -264,86 +671,49 @@ class SignalVinAutomation:
             log_message(f"❌ Login error: {e}")
             return False
     
-    def extract_export_value(self):
-        """Extract export value from API responses"""
-        # Wait for Flutter
-        time.sleep(3)
+    def extract_export_value(self, parsed):
+        """Extract export value and vehicle info from parsed API responses"""
+        decode = parsed.get('decode', {})
+        offer = parsed.get('offer/initial', {})
+        trends = parsed.get('wholesale_value_trends', {})
+        
+        # Decode API
+        vehicle = {
+            'make': decode.get('make', ''),
+            'model': decode.get('model', ''),
+            'trim': decode.get('selected_trim') or decode.get('suggested_trim') or ''
+        }
         
-        exchange_rate = None
-        fx_cushion = 0
-        export_cost = None
-        target_gpu = None
-        us_wholesale_value = None
         customs_duty_rate = 0
-        weekly_depreciation_factor = 0
-        average_days_in_inventory = 0
-        self.vehicle_make = ''
-        self.vehicle_model = ''
-        self.vehicle_trim = ''
-        
-        for resp in self.captured_responses:
-            url = resp.get('url', '')
-            body = resp.get('body', '')
-            
-            if not body or body.startswith('(function') or body.startswith('<!'):
-                continue
-            
+        if decode.get('customs_duty_rate') is not None:
             try:
-                data = json.loads(body)
+                customs_duty_rate = float(decode['customs_duty_rate'])
             except:
-                continue
-            
-            # Decode API
-            if 'decode' in url and 'signal.vin' in url:
-                if 'make' in data:
-                    self.vehicle_make = data.get('make', '')
-                if 'model' in data:
-                    self.vehicle_model = data.get('model', '')
-                if 'selected_trim' in data and data['selected_trim']:
-                    self.vehicle_trim = data.get('selected_trim', '')
-                elif 'suggested_trim' in data and data['suggested_trim']:
-                    self.vehicle_trim = data.get('suggested_trim', '')
-                
-                if 'customs_duty_rate' in data and data['customs_duty_rate'] is not None:
-                    try:
-                        customs_duty_rate = float(data['customs_duty_rate'])
-                    except:
-                        pass
-            
-            # Offer/initial API
-            if 'offer/initial' in url:
-                if 'exchange_rate' in data:
-                    er = data['exchange_rate']
-                    if isinstance(er, dict) and 'to_currency_rate' in er:
-                        exchange_rate = float(er['to_currency_rate'])
-                    elif isinstance(er, (int, float)):
-                        exchange_rate = float(er)
-                
-                if 'current_weekly_depreciation_factor' in data:
-                    weekly_depreciation_factor = float(data['current_weekly_depreciation_factor'])
-                
-                if 'offer_setup' in data:
-                    setup = data['offer_setup']
-                    if 'export_cost_amount' in setup:
-                        export_cost = float(setup['export_cost_amount'])
-                    if 'target_gpu_amount' in setup:
-                        target_gpu = float(setup['target_gpu_amount'])
-                    if 'fx_cushion_amount' in setup:
-                        fx_cushion = float(setup['fx_cushion_amount'])
-                    if 'average_days_in_inventory' in setup:
-                        average_days_in_inventory = int(setup['average_days_in_inventory'])
-            
-            # Wholesale value trends API
-            if 'wholesale_value_trends' in url:
-                if 'wholesale_value_trends' in data and data['wholesale_value_trends'] is not None:
-                    trends_data = data['wholesale_value_trends']
-                    
-                    if 'predicted_wholesale_value' in trends_data and trends_data['predicted_wholesale_value'] is not None:
-                        pwv = trends_data['predicted_wholesale_value']
-                        if isinstance(pwv, dict) and 'amount' in pwv:
-                            us_wholesale_value = float(pwv['amount'])
-                        elif isinstance(pwv, (int, float)):
-                            us_wholesale_value = float(pwv)
+                pass
+        
+        # Offer/initial API
+        exchange_rate = None
+        er = offer.get('exchange_rate')
+        if isinstance(er, dict) and 'to_currency_rate' in er:
+            exchange_rate = float(er['to_currency_rate'])
+        elif isinstance(er, (int, float)):
+            exchange_rate = float(er)
+        
+        weekly_depreciation_factor = float(offer.get('current_weekly_depreciation_factor', 0))
+        
+        setup = offer.get('offer_setup') or {}
+        export_cost = float(setup['export_cost_amount']) if setup.get('export_cost_amount') is not None else None
+        target_gpu = float(setup['target_gpu_amount']) if setup.get('target_gpu_amount') is not None else None
+        fx_cushion = float(setup.get('fx_cushion_amount', 0))
+        average_days_in_inventory = int(setup.get('average_days_in_inventory', 0))
+        
+        # Wholesale value trends API
+        us_wholesale_value = None
+        pwv = (trends.get('wholesale_value_trends') or {}).get('predicted_wholesale_value')
+        if isinstance(pwv, dict) and 'amount' in pwv:
+            us_wholesale_value = float(pwv['amount'])
+        elif isinstance(pwv, (int, float)):
+            us_wholesale_value = float(pwv)
         
         # Calculate export value
         if us_wholesale_value and exchange_rate:
@@ -355,15 +725,15 @@ class SignalVinAutomation:
             depreciation_usd = us_wholesale_value * depreciation_rate * weeks
             
             net_usd = us_wholesale_value - (export_cost or 0) - (target_gpu or 0) - customs_duty - depreciation_usd
-            export_value_cad = int(round(net_usd * effective_fx))
+            export_value_cad = float(round(net_usd * effective_fx))
             
-            log_message(f"💰 Calculated: ${us_wholesale_value} USD → ${export_value_cad} CAD")
-            return str(export_value_cad)
+            log_message(f"💰 Calculated: ${us_wholesale_value} USD → ${export_value_cad:.0f} CAD")
+            return export_value_cad, vehicle
         
-        return None
+        return None, vehicle
     
-    def appraise_vehicle(self, vin, odometer, trim=None, list_price=0, listing_url='', carfax_link='', make='', model=''):
-        result = {
+    def _new_result(self, vin, odometer, trim, list_price, listing_url, carfax_link, make, model):
+        return {
             'vin': vin,
             'odometer': odometer,
             'trim': trim,
@@ -378,43 +748,102 @@ class SignalVinAutomation:
             'status': 'PENDING',
             'error': None
         }
+    
+    def _slim(self, data):
+        # Keep only the fields used for the calculation; drop the body
+        if not isinstance(data, dict):
+            return {}
+        return {key: data[key] for key in SIGNAL_API_FIELDS if key in data}
+    
+    def _apply_export_value(self, result, parsed):
+        export_value, vehicle = self.extract_export_value(parsed)
+        
+        if export_value is not None:
+            result['export_value_cad'] = export_value
+            list_price = result['list_price']
+            if export_value > 0 and list_price > 0:
+                result['profit'] = export_value - list_price
+                result['status'] = 'PROFIT' if result['profit'] > 0 else 'LOSS'
+            else:
+                result['status'] = 'SUCCESS'
+        else:
+            result['status'] = 'NO DATA'
+            result['error'] = 'Could not extract export value'
+        
+        result['signal_trim'] = vehicle['trim']
+        return vehicle
+    
+    @staticmethod
+    def _response_predicate(matches_url, vin, started):
+        # Pages are reused across VINs, so a late response for the previous
+        # VIN can still arrive; only accept requests made for this one
+        def predicate(response):
+            request = response.request
+            if not matches_url(request.url):
+                return False
+            try:
+                text = request.url + (request.post_data or '')
+            except Exception:
+                text = request.url
+            if vin in text:
+                return True
+            # Requests that carry no VIN at all must have been sent after
+            # this navigation started
+            return not VIN_TOKEN_RE.search(text) and request.timing.get('startTime', 0) >= started
+        return predicate
+    
+    async def appraise_vehicle(self, page, vin, odometer, trim=None, list_price=0, listing_url='', carfax_link='', make='', model=''):
+        result = self._new_result(vin, odometer, trim, list_price, listing_url, carfax_link, make, model)
         
         try:
-            self.captured_responses = []
-            
             url = f"{self.signal_url}/appraisal/calculate-export?vin={vin}&odometer={odometer}&is-km=true"
             log_message(f"🌐 Processing: {vin}")
             
-            self.page.goto(url)
-            time.sleep(12)
+            # Subscribe before navigating so no response is missed, then
+            # continue as soon as all three have arrived
+            started = time.time() * 1000
+            waiters = [
+                asyncio.ensure_future(page.wait_for_response(
+                    self._response_predicate(matches_url, vin, started), timeout=RESPONSE_TIMEOUT_MS
+                ))
+                for matches_url in SIGNAL_API_RESPONSES.values()
+            ]
+            
+            try:
+                await page.goto(url)
+                
+                if 'login' in page.url.lower():
+                    result['status'] = 'SESSION_EXPIRED'
+                    result['error'] = 'Need to re-login'
+                    return result
+                
+                responses = await asyncio.gather(*waiters, return_exceptions=True)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
             
-            if 'login' in self.page.url.lower():
+            # The Flutter app redirects to login client-side, after goto() has
+            # resolved, so missing responses may just mean an expired session
+            if any(isinstance(response, Exception) for response in responses) and 'login' in page.url.lower():
                 result['status'] = 'SESSION_EXPIRED'
                 result['error'] = 'Need to re-login'
                 return result
             
-            # Scroll to load content
-            for _ in range(3):
-                self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                time.sleep(1)
-            
-            time.sleep(5)
+            parsed = {}
+            for endpoint, response in zip(SIGNAL_API_RESPONSES, responses):
+                if isinstance(response, Exception):
+                    continue
+                try:
+                    parsed[endpoint] = self._slim(orjson.loads(await response.body()))
+                except:
+                    continue
             
-            export_value = self.extract_export_value()
+            vehicle = self._apply_export_value(result, parsed)
             
-            if export_value:
-                result['export_value_cad'] = export_value
-                export_num = float(export_value)
-                if export_num > 0 and list_price > 0:
-                    result['profit'] = export_num - list_price
-                    result['status'] = 'PROFIT' if result['profit'] > 0 else 'LOSS'
-                else:
-                    result['status'] = 'SUCCESS'
-            else:
-                result['status'] = 'NO DATA'
-                result['error'] = 'Could not extract export value'
-            
-            result['signal_trim'] = self.vehicle_trim
+            # Recording needs the actual request behind all three responses
+            recordable = not any(isinstance(response, Exception) for response in responses)
+            if result['export_value_cad'] is not None and recordable:
+                await self._check_api_replay(vin, odometer, responses, vehicle, result['export_value_cad'])
             
         except Exception as e:
             result['error'] = str(e)
@@ -422,66 +851,287 @@ class SignalVinAutomation:
             log_message(f"❌ Error: {e}")
         
         return result
+    
+    @staticmethod
+    def _spellings(value):
+        # Raw, percent-encoded and form-encoded forms a value can take in a request
+        return {
+            'raw': value,
+            'quote': quote(value, safe=''),
+            'path': quote(value),
+            'plus': quote_plus(value)
+        }
+    
+    async def _check_api_replay(self, vin, odometer, responses, vehicle, export_value):
+        """Record the API requests behind a browser appraisal, then switch to
+        replaying them once another VIN gives the same export value both ways"""
+        if self.api_replay is not None or self.api_replay_failed or self.api_checking:
+            return
+        
+        candidate = self.api_candidate
+        if candidate is None:
+            await self._record_api_templates(vin, odometer, responses, vehicle)
+            return
+        if candidate['reference']['vin'] == vin:
+            return
+        
+        self.api_checking = True
+        try:
+            parsed = await self._api_appraise(candidate, vin, str(odometer))
+            api_value, _ = self.extract_export_value(parsed)
+        except Exception:
+            api_value = None
+        finally:
+            self.api_checking = False
+        
+        if self.api_candidate is not candidate:
+            return
+        if api_value is not None and round(api_value, 2) == round(export_value, 2):
+            self.api_replay = candidate
+            log_message("⚡ Captured Signal.vin API session, switching to direct API calls")
+        else:
+            log_message(f"⚠️ API replay disagreed with the browser for {vin}, staying on the browser")
+            self.api_replay_failed = True
+            await self._disable_api()
+    
+    async def _record_api_templates(self, vin, odometer, responses, vehicle):
+        """Remember the API requests behind a browser appraisal as a replay candidate"""
+        odometer = str(odometer)
+        # Short odometer values can't be substituted safely
+        if len(odometer) < 3:
+            return
+        
+        templates = {}
+        for endpoint, response in zip(SIGNAL_API_RESPONSES, responses):
+            request = response.request
+            body = request.post_data
+            if vin not in request.url and vin not in (body or ''):
+                return
+            headers = {
+                name: value for name, value in (await request.all_headers()).items()
+                if not name.startswith(':') and name not in ('host', 'content-length', 'accept-encoding')
+            }
+            templates[endpoint] = {
+                'method': request.method,
+                'url': request.url,
+                'headers': headers,
+                'body': body
+            }
+        
+        # Without the odometer in any request, every VIN would be
+        # appraised at the reference car's mileage
+        odometer_pattern = re.compile(rf"(?<![\d.]){re.escape(odometer)}(?![\d.])")
+        if not any(
+            odometer_pattern.search(template['url']) or odometer_pattern.search(template['body'] or '')
+            for template in templates.values()
+        ):
+            return
+        
+        # Another worker may have recorded them while we awaited headers
+        if self.api_candidate is not None or self.api_replay_failed:
+            return
+        
+        trim = str(vehicle['trim'] or '')
+        spellings = set(self._spellings(trim).values()) if trim else set()
+        self.api_candidate = {
+            'templates': templates,
+            'reference': {'vin': vin, 'odometer': odometer, 'trim': trim},
+            # Requests that carry the decoded trim have to wait for the new decode
+            'needs_decode_first': any(
+                spelling in template['url'] or spelling in (template['body'] or '')
+                for endpoint, template in templates.items() if endpoint != 'decode'
+                for spelling in spellings
+            )
+        }
+        self.api_client = httpx.AsyncClient(
+            http2=True,
+            timeout=RESPONSE_TIMEOUT_MS / 1000,
+            limits=httpx.Limits(max_connections=50)
+        )
+    
+    async def _api_request(self, replay, endpoint, vin, odometer, trim):
+        template = replay['templates'][endpoint]
+        reference = replay['reference']
+        
+        # Substitute everything in one pass so a value written in never
+        # gets matched again (e.g. odometer digits inside the new VIN)
+        def fill(text, preferred):
+            if not text:
+                return text
+            values = {reference['vin']: vin}
+            if trim and reference['trim']:
+                old, new = self._spellings(reference['trim']), self._spellings(trim)
+                # Spellings that coincide for the reference trim take the
+                # form that suits where they appear
+                for form in sorted(old, key=lambda form: form == preferred):
+                    values[old[form]] = new[form]
+            patterns = [re.escape(value) for value in sorted(values, key=len, reverse=True)]
+            patterns.append(rf"(?<![\d.]){re.escape(reference['odometer'])}(?![\d.])")
+            pattern = re.compile('|'.join(patterns))
+            return pattern.sub(lambda match: values.get(match.group(0), odometer), text)
+        
+        response = await self.api_client.request(
+            template['method'],
+            fill(template['url'], 'quote'),
+            headers=template['headers'],
+            content=fill(template['body'], 'raw')
+        )
+        response.raise_for_status()
+        return self._slim(orjson.loads(response.content))
+    
+    async def _api_appraise(self, replay, vin, odometer):
+        parsed = {}
+        endpoints = list(SIGNAL_API_RESPONSES)
+        signal_trim = ''
+        
+        if replay['needs_decode_first']:
+            decode = await self._api_request(replay, 'decode', vin, odometer, '')
+            parsed['decode'] = decode
+            endpoints.remove('decode')
+            signal_trim = str(decode.get('selected_trim') or decode.get('suggested_trim') or '')
+        
+        responses = await asyncio.gather(*(
+            self._api_request(replay, endpoint, vin, odometer, signal_trim) for endpoint in endpoints
+        ))
+        parsed.update(zip(endpoints, responses))
+        return parsed
+    
+    async def appraise_vehicle_api(self, vin, odometer, trim=None, list_price=0, listing_url='', carfax_link='', make='', model=''):
+        """Appraise through Signal.vin's JSON API; returns None when the browser should be used instead"""
+        result = self._new_result(vin, odometer, trim, list_price, listing_url, carfax_link, make, model)
+        log_message(f"⚡ Processing via API: {vin}")
+        
+        try:
+            parsed = await self._api_appraise(self.api_replay, vin, str(odometer))
+            self._apply_export_value(result, parsed)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (401, 403):
+                log_message("🔒 Signal.vin API session rejected, falling back to the browser")
+                await self._disable_api()
+            return None
+        except Exception:
+            return None
+        
+        if result['export_value_cad'] is None:
+            return None
+        return result
+    
+    async def _disable_api(self):
+        self.api_replay = None
+        self.api_candidate = None
+        client, self.api_client = self.api_client, None
+        if client:
+            await client.aclose()
 
 # ============================================
 # BACKGROUND PROCESSING
 # ============================================
 
-def process_vehicles_background(vehicles, config):
-    """Process vehicles in background thread"""
-    global processing_state
-    
-    processing_state['is_processing'] = True
-    processing_state['total'] = len(vehicles)
-    processing_state['progress'] = 0
-    processing_state['results'] = []
-    processing_state['logs'] = []
+async def process_vehicles_async(vehicles, config, run_id, save_executor, save_futures):
+    """Appraise vehicles concurrently, one browser context per worker"""
+    automation = SignalVinAutomation(config['BROWSER_ENDPOINT'], config['SIGNAL_EMAIL'])
+    save_buffer = []
     
-    automation = SignalVinAutomation(headless=True)
+    def flush_saves():
+        if save_buffer:
+            save_futures.append(save_executor.submit(
+                save_batch,
+                config['SUPABASE_URL'],
+                config['_headers'],
+                save_buffer.copy()
+            ))
+            save_buffer.clear()
     
     try:
-        log_message("🚀 Starting browser...")
-        automation.start()
+        log_message("🚀 Connecting to browser...")
+        await automation.start()
         
-        if not automation.login(config['SIGNAL_EMAIL'], config['SIGNAL_PASSWORD']):
+        if not await automation.login(config['SIGNAL_EMAIL'], config['SIGNAL_PASSWORD']):
             log_message("❌ Login failed!")
-            processing_state['is_processing'] = False
             return
+        await automation.save_session()
         
-        for i, item in enumerate(vehicles):
-            processing_state['current_vin'] = item['vin']
-            processing_state['progress'] = i + 1
-            
-            result = automation.appraise_vehicle(
-                item['vin'],
-                item['odometer'],
-                item.get('trim', ''),
-                item.get('list_price', 0),
-                item.get('listing_url', ''),
-                item.get('carfax_link', ''),
-                item.get('make', ''),
-                item.get('model', '')
-            )
+        workers = min(APPRAISAL_CONCURRENCY, len(vehicles))
+        semaphore = asyncio.Semaphore(workers)
+        # Browser pages are reused across VINs and recycled periodically;
+        # the semaphore guarantees a free slot for every browser appraisal
+        browser_slots = asyncio.Queue()
+        for _ in range(workers):
+            browser_slots.put_nowait({'page': None, 'uses': 0})
+        log_message(f"⚡ Appraising with {workers} parallel workers")
+        
+        async def process_one(item):
+            async with semaphore:
+                with state_lock:
+                    if processing_state['stop_requested'] or processing_state['run_id'] != run_id:
+                        return
+                    processing_state['current_vin'] = item['vin']
+                    publish_event('status', status_snapshot())
+                
+                args = (
+                    item['vin'],
+                    item['odometer'],
+                    item.get('trim', ''),
+                    item.get('list_price', 0),
+                    item.get('listing_url', ''),
+                    item.get('carfax_link', ''),
+                    item.get('make', ''),
+                    item.get('model', '')
+                )
+                
+                result = None
+                if automation.api_replay:
+                    result = await automation.appraise_vehicle_api(*args)
+                
+                if result is None:
+                    slot = browser_slots.get_nowait()
+                    try:
+                        page = await automation.worker_page(slot)
+                        result = await automation.appraise_vehicle(page, *args)
+                        if result['status'] == 'ERROR':
+                            # Don't carry a broken page over to the next VIN
+                            slot['uses'] = CONTEXT_RECYCLE_VINS
+                    finally:
+                        browser_slots.put_nowait(slot)
             
-            processing_state['results'].append(result)
+            with state_lock:
+                if processing_state['run_id'] != run_id:
+                    return
+                processing_state['results'].append(result)
+                processing_state['progress'] += 1
+                publish_event('status', status_snapshot())
             
             # Save to database if export value found
-            if result.get('export_value_cad'):
-                save_to_appraisal_results(
-                    config['SUPABASE_URL'],
-                    config['SUPABASE_API_KEY'],
-                    result
-                )
-            
-            time.sleep(1)
+            if result.get('export_value_cad') is not None:
+                save_buffer.append(result)
+                if len(save_buffer) >= SAVE_BATCH_SIZE:
+                    flush_saves()
         
-        log_message(f"✅ Completed processing {len(vehicles)} vehicles!")
+        await asyncio.gather(*(process_one(item) for item in vehicles))
         
+        log_message(f"✅ Completed processing {len(vehicles)} vehicles!")
+    finally:
+        flush_saves()
+        await automation.stop()
+
+def process_vehicles_background(vehicles, config, run_id):
+    """Process vehicles in background thread"""
+    save_executor = ThreadPoolExecutor(max_workers=SAVE_WORKERS)
+    save_futures = []
+    
+    try:
+        config['BROWSER_ENDPOINT'] = get_shared_browser_endpoint(headless=True)
+        asyncio.run(process_vehicles_async(vehicles, config, run_id, save_executor, save_futures))
     except Exception as e:
         log_message(f"❌ Error: {e}")
     finally:
-        automation.stop()
-        processing_state['is_processing'] = False
+        # Let pending saves finish before reporting the run as done
+        wait(save_futures)
+        save_executor.shutdown()
+        with state_lock:
+            if processing_state['run_id'] == run_id:
+                processing_state['is_processing'] = False
+                publish_event('status', status_snapshot())
 
 # ============================================
 # ROUTES
@@ -500,31 +1150,39 @@ def update_config():
     CONFIG['SUPABASE_URL'] = data.get('supabase_url', CONFIG['SUPABASE_URL'])
     CONFIG['SUPABASE_API_KEY'] = data.get('supabase_api_key', CONFIG['SUPABASE_API_KEY'])
     CONFIG['SUPABASE_TABLE'] = data.get('supabase_table', CONFIG['SUPABASE_TABLE'])
+    refresh_supabase_headers()
     return jsonify({'status': 'success'})
 
 @app.route('/api/fetch-inventory')
 def api_fetch_inventory():
     """Fetch inventory from Supabase"""
-    data = fetch_inventory(CONFIG['SUPABASE_URL'], CONFIG['SUPABASE_API_KEY'], CONFIG['SUPABASE_TABLE'])
-    
-    # Filter valid VINs
+    # Filter valid VINs page by page with vectorized string ops
+    total = 0
     valid = []
-    for row in data:
-        vin = str(row.get('vin', '')).strip().upper()
-        if is_valid_vin(vin):
-            valid.append({
-                'vin': vin,
-                'odometer': str(row.get('kilometers', '0')).strip() or '0',
-                'trim': str(row.get('trim', '')).strip(),
-                'list_price': parse_price(str(row.get('price', ''))),
-                'listing_url': str(row.get('listing_link', '')).strip(),
-                'carfax_link': str(row.get('carfax_link', '')).strip(),
-                'make': str(row.get('make', '')).strip(),
-                'model': str(row.get('model', '')).strip()
-            })
-    
-    return jsonify({
-        'total': len(data),
+    try:
+        for page in fetch_inventory(CONFIG['SUPABASE_URL'], CONFIG['_headers'], CONFIG['SUPABASE_TABLE']):
+            total += len(page)
+            
+            df = pd.DataFrame(page, columns=list(INVENTORY_FIELDS), dtype=object).fillna('')
+            for column in INVENTORY_FIELDS:
+                df[column] = df[column].astype(str).str.strip()
+            df['vin'] = df['vin'].str.upper()
+            
+            mask = (df['vin'].str.len() >= 17) & df['vin'].str[0].isin(VALID_VIN_PREFIXES)
+            df = df.loc[mask].copy()
+            
+            df['kilometers'] = df['kilometers'].mask(df['kilometers'] == '', '0')
+            df['price'] = pd.to_numeric(
+                df['price'].str.replace(PRICE_CLEAN_RE, '', regex=True), errors='coerce'
+            ).fillna(0.0)
+            
+            valid.extend(df.rename(columns=INVENTORY_FIELDS).to_dict('records'))
+    except Exception as e:
+        log_message(f"❌ Error fetching inventory: {e}")
+        return jsonify({'status': 'error', 'message': f'Error fetching inventory: {e}'}), 502
+    
+    return json_response({
+        'total': total,
         'valid': len(valid),
         'vehicles': valid
     })
@@ -532,19 +1190,30 @@ def api_fetch_inventory():
 @app.route('/api/start-processing', methods=['POST'])
 def api_start_processing():
     """Start processing vehicles"""
-    global processing_state
-    
-    if processing_state['is_processing']:
-        return jsonify({'status': 'error', 'message': 'Already processing'})
-    
     data = request.json
     vehicles = data.get('vehicles', [])
     
     if not vehicles:
         return jsonify({'status': 'error', 'message': 'No vehicles to process'})
     
+    with state_lock:
+        if processing_state['is_processing']:
+            if processing_state['stop_requested']:
+                return jsonify({'status': 'error', 'message': 'Still stopping the previous run'})
+            return jsonify({'status': 'error', 'message': 'Already processing'})
+        processing_state['run_id'] += 1
+        run_id = processing_state['run_id']
+        processing_state['is_processing'] = True
+        processing_state['stop_requested'] = False
+        processing_state['current_vin'] = ''
+        processing_state['total'] = len(vehicles)
+        processing_state['progress'] = 0
+        processing_state['results'] = []
+        processing_state['logs'].clear()
+        publish_event('status', status_snapshot())
+    
     # Start background thread
-    thread = threading.Thread(target=process_vehicles_background, args=(vehicles, CONFIG.copy()))
+    thread = threading.Thread(target=process_vehicles_background, args=(vehicles, CONFIG.copy(), run_id))
     thread.daemon = True
     thread.start()
     
@@ -553,19 +1222,54 @@ def api_start_processing():
 @app.route('/api/status')
 def api_status():
     """Get processing status"""
-    return jsonify({
-        'is_processing': processing_state['is_processing'],
-        'current_vin': processing_state['current_vin'],
-        'progress': processing_state['progress'],
-        'total': processing_state['total'],
-        'results_count': len(processing_state['results']),
-        'logs': processing_state['logs'][-20:]  # Last 20 logs
+    with state_lock:
+        status = status_snapshot()
+        status['logs'] = list(processing_state['logs'])[-20:]  # Last 20 logs
+    return json_response(status)
+
+@app.route('/api/stream')
+def api_stream():
+    """Stream status and log updates as Server-Sent Events"""
+    events = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    with state_lock:
+        if len(stream_subscribers) >= STREAM_MAX_SUBSCRIBERS:
+            return jsonify({'status': 'error', 'message': 'Too many status streams'}), 503
+        # Start the client off with the current state and recent logs
+        events.put_nowait(format_event('status', status_snapshot()))
+        for line in list(processing_state['logs'])[-20:]:
+            events.put_nowait(format_event('log', line))
+        stream_subscribers.append(events)
+    
+    def generate():
+        try:
+            while True:
+                try:
+                    yield events.get(timeout=15)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                
+                with state_lock:
+                    finished = not processing_state['is_processing']
+                if finished:
+                    # Send what is already queued, then free the thread
+                    while not events.empty():
+                        yield events.get_nowait()
+                    return
+        finally:
+            with state_lock:
+                stream_subscribers.remove(events)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
 @app.route('/api/results')
 def api_results():
     """Get processing results"""
-    results = processing_state['results']
+    with state_lock:
+        results = list(processing_state['results'])
     
     profitable = [r for r in results if r.get('profit') and r['profit'] > 0]
     losses = [r for r in results if r.get('profit') is not None and r['profit'] <= 0]
@@ -573,7 +1277,7 @@ def api_results():
     
     total_profit = sum(r['profit'] for r in profitable)
     
-    return jsonify({
+    return json_response({
         'all': results,
         'profitable': profitable,
         'losses': losses,
@@ -590,8 +1294,11 @@ def api_results():
 @app.route('/api/stop-processing', methods=['POST'])
 def api_stop_processing():
     """Stop processing"""
-    global processing_state
-    processing_state['is_processing'] = False
+    # The run winds down in its own thread and reports when it is done
+    with state_lock:
+        if processing_state['is_processing']:
+            processing_state['stop_requested'] = True
+            publish_event('status', status_snapshot())
     return jsonify({'status': 'success'})
 
 # ============================================